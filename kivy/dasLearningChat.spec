@@ -18,7 +18,8 @@ a = Analysis(
         "kivymd.uix.label",
         "kivymd.uix.screen",
         "kivymd.uix.boxlayout",
-        "kivymd.uix.scrollview",
+        "kivy.uix.recycleview",
+        "kivy.uix.recycleboxlayout",
         "kivy.metrics",
         "kivymd.icon_definitions",
         "kivymd.uix.dropdownitem",
@@ -16,10 +16,17 @@ import os
 os.environ['KIVY_GL_BACKEND'] = 'sdl2'
 # sys: interpreter internals; here for frozen-bundle checks and base path logic.
 import sys
-# re: regular expressions; used for cleaning model output (e.g., removing <THINK> blocks).
+# re: regular expressions; used for cleaning copied text (e.g., removing Kivy markup tags).
 import re
-# Thread: lightweight parallel execution for non‑blocking HTTP calls to the LLM.
+# asyncio: event loop that drives the non‑blocking HTTP calls to the LLM.
+import asyncio
+# Thread: lightweight parallel execution; hosts the asyncio loop off the UI thread.
 from threading import Thread
+# lru_cache: memoizes a function's results by its arguments.
+# partial: binds arguments to a callable (C-implemented, no closure per menu item).
+from functools import lru_cache, partial
+# deque: list-like container; with maxlen it drops the oldest items on append.
+from collections import deque
 # from datetime import datetime  # kept commented by the author for optional timestamping
 
 # kivy & kivymd imports
@@ -27,34 +34,26 @@ from threading import Thread
 from kivy.core.window import Window
 # Builder: loads .kv language UI files; returns the root widget when load_file is used.
 from kivy.lang import Builder
-# StringProperty/NumericProperty/ObjectProperty: Kivy observable properties for binding.
-from kivy.properties import StringProperty, NumericProperty, ObjectProperty
 # dp/sp: device‑independent pixels / scale‑independent pixels for consistent sizing.
 from kivy.metrics import dp, sp
 # resource_add_path: adds lookup directories for KV includes and other resources.
 from kivy.resources import resource_add_path
+# Clock: schedules callbacks on the Kivy main thread (safe place for UI updates).
+from kivy.clock import Clock
 # Clipboard: system clipboard access (copy/paste).
 from kivy.core.clipboard import Clipboard
 # platform: utility to detect runtime platform ("android", "win", etc.).
 from kivy.utils import platform
 # MDApp: KivyMD application base class with Material Design theming/behavior.
 from kivymd.app import MDApp
-# MDDropdownMenu: Material Design dropdown menu (e.g., the top-right menu here).
-from kivymd.uix.menu import MDDropdownMenu
+# MDFlatButton: low‑emphasis button variant used inside MDDialog.
+from kivymd.uix.button import MDFlatButton
 # MDLabel: text label supporting theming and (optionally) markup.
 from kivymd.uix.label import MDLabel
-# MDFlatButton/MDFloatingActionButton: Material buttons used in dialogs and as inline actions.
-from kivymd.uix.button import MDFlatButton, MDFloatingActionButton
-# MDDialog: modal dialog container with title/body/buttons.
-from kivymd.uix.dialog import MDDialog
-# MDSpinner: loading spinner; here referenced via TempSpinWait in chat screen.
-from kivymd.uix.spinner import MDSpinner
-# MDBoxLayout: box layout with Material defaults.
-from kivymd.uix.boxlayout import MDBoxLayout
-
-# other public modules
-# m2r2.convert: helper to convert Markdown → reStructuredText for rich display.
-from m2r2 import convert
+# Widgets that are only needed by some handlers (MDDropdownMenu, MDDialog, MDSnackbar)
+# and heavy helpers (m2r2/mistune, webbrowser) are imported inside the functions that use
+# them, so they do not add to the app's start-up time. (MDLabel and the buttons are loaded
+# at start-up anyway, by the chat screen and the KV files.)
 
 # IMPORTANT: Set this property for keyboard behavior
 # Window.softinput_mode controls how the soft keyboard affects layout. "below_target"
@@ -64,17 +63,25 @@ Window.softinput_mode = "below_target"
 # Import your screen classes
 # These are your custom Kivy Screen implementations defined elsewhere.
 from screens.ollama_screen import OllamaInputScreen
-from screens.chatbot_screen import ChatbotScreen, TempSpinWait
+# Importing chatbot_screen also registers the chat history row classes (UserMsgItem,
+# BotMsgItem, ...) that the RecycleView looks up by name.
+from screens.chatbot_screen import ChatbotScreen
 
 # import our local api & modules
 # get_llm_models: queries the Ollama server for available models.
-# chat_with_llm: sends a chat request (with messages) to Ollama and streams/returns a reply.
-from ollamaApi import get_llm_models, chat_with_llm
-# MyRstDocument: custom widget that renders RST (converted from Markdown) with styling and copy button.
-from myrst import MyRstDocument
+# achat_with_llm: coroutine that sends a chat request (with messages) to Ollama and returns a reply.
+# tags_endpoint/chat_endpoint: the Ollama endpoint URLs for a base URI.
+from ollamaApi import get_llm_models, achat_with_llm, tags_endpoint, chat_endpoint
+# split_md_tiles: splits a Markdown reply into the tiles of its chat history rows.
+from mdTiles import split_md_tiles
 
 ## Global definitions
 __version__ = "0.2.0"
+# Settings panel (App.open_settings) for the [chat] section of the app's .ini file.
+_SETTINGS_JSON = '''[
+    {"type": "numeric", "title": "Context size", "section": "chat", "key": "context_size",
+     "desc": "How many of the latest chat messages are sent to the LLM per turn"}
+]'''
 # Determine the base path for your application's resources
 # sys.frozen: indicates running from a bundled executable (e.g., PyInstaller);
 # sys._MEIPASS: temp dir where bundled resources are unpacked.
@@ -90,27 +97,94 @@ kv_files_dir = os.path.join(base_path, 'kv_files')
 # Register additional search path so KV includes like `#:include` can be found.
 resource_add_path(kv_files_dir)
 
+# re.compile: pre-built regular expression, reused for every copy.
+# _MARKUP_RE matches Kivy markup tags like [b] or [/color] for plain-text copies.
+_MARKUP_RE = re.compile(r'\[/?(?:color|b|i|u|s|sub|sup|font|font_context|font_family|font_features|size|ref|anchor|text_language).*?\]')
+
+@lru_cache(maxsize=256)
+def _md_to_rst(md_text):
+    # convert(): Markdown → reStructuredText, cached by the Markdown string so a message
+    # is only parsed once however often its row is rendered. The RST carries no theme
+    # styling (colors are applied by MyRstDocument), so the text alone is a safe key.
+    # m2r2 (with mistune) is imported on the first bot message, not at start-up.
+    from m2r2 import convert
+    return convert(md_text)
+
 ## The APP definitions
 class MyApp(MDApp):
     # Title shown on desktop window chrome; on Android it contributes to app metadata.
     title = "My Ollama Chatbot"
-    # StringProperty: bindable URI of the Ollama server (e.g., http://host:11434).
-    ollama_uri = StringProperty("")
-    # ObjectProperty: holders for dropdown menus created at runtime.
-    top_menu = ObjectProperty()
-    llm_menu = ObjectProperty()
-    # tmp_spin: reference to a transient spinner widget while waiting for responses.
-    tmp_spin = ObjectProperty(None)
+    # Runtime state is kept in plain attributes, not Kivy properties: nothing binds to
+    # them (KV only calls `app.llm_menu.open()` on release), so property dispatch on
+    # every change would be pure overhead.
+    # ollama_uri: URI of the Ollama server (e.g., http://host:11434).
+    ollama_uri = ""
+    # Holders for dropdown menus created at runtime.
+    top_menu = None
+    llm_menu = None
+    # chat_history_id: the chat history RecycleView, wired on the first chat screen entry.
+    chat_history_id = None
+    # use_kivy_settings: hide Kivy's own panel in the settings, only the app's are shown.
+    use_kivy_settings = False
+
+    def build_config(self, config):
+        # build_config(): Kivy lifecycle hook that defines default settings; they are saved
+        # to (and read back from) the app's .ini file, available as `self.config`.
+        # context_size: how many of the latest chat messages are sent to the LLM per turn.
+        config.setdefaults('chat', {
+            'context_size': 3,
+        })
+
+    def build_settings(self, settings):
+        # build_settings(): Kivy hook that fills the settings panel shown by open_settings()
+        # (the "Settings" entry of the top menu); changes are saved to the .ini file.
+        settings.add_json_panel("Chat", self.config, data=_SETTINGS_JSON)
+
+    def on_config_change(self, config, section, key, value):
+        # Called when a setting is changed in the panel: resize the context window, keeping
+        # its latest messages.
+        if (section, key) == ('chat', 'context_size'):
+            self._ctx = deque(self._ctx, maxlen=self._context_size())
+
+    def _context_size(self):
+        # context_size as a count of at least 1; the numeric setting also accepts e.g. "4.0"
+        # or "0", and an invalid value falls back to the default.
+        try:
+            return max(1, int(float(self.config.get('chat', 'context_size'))))
+        except ValueError:
+            return 3
 
     def build(self):
         # build(): Kivy/MDApp lifecycle method; must return the root widget of the UI.
         # Typically we set up theme, initialize state, and load the KV tree here.
         # Default Ollama endpoint; user can override via the input screen.
-        self.ollama_uri = "http://localhost:11434"
-        # selected_llm: name/tag of the active model; set later when models are fetched.
+        self._set_ollama_uri("http://localhost:11434")
+        # _msg_body_template: the chat request payload, allocated once; send_message only
+        # swaps in the model and messages. Safe to reuse because a new send is only
+        # possible after the previous reply is done (the send button is disabled).
+        self._msg_body_template = {"model": None, "messages": None, "stream": True}
+        # selected_llm: name/tag of the active model; set later when models are fetched and
+        # empty while they load or when none were found (send_message refuses to send then).
         self.selected_llm = ""
-        # messages: running OpenAI‑style chat transcript [{role, content}, ...].
+        # _models_loading: True while the model list of the current URI is being fetched
+        # and built, to tell "wait for the models" from "this server has none".
+        self._models_loading = False
+        # _models_fetch_id: bumped by every model fetch; the result of an older one is
+        # dropped, so a slow (e.g., unreachable) URI cannot overwrite the models of the
+        # URI entered after it. _llm_menu_ev: Clock event of a menu build in progress.
+        self._models_fetch_id = 0
+        self._llm_menu_ev = None
+        # messages: append-only log of the chat [{role, content}, ...]; assistant entries also
+        # keep their "rst". It is never sent as a whole, see _ctx.
         self.messages = []
+        # _ctx: the bounded context window sent to the LLM (plain {role, content} dicts);
+        # deque(maxlen=...) drops the oldest message by itself, no per-turn slicing.
+        self._ctx = deque(maxlen=self._context_size())
+        # dp()/sp() results used by the Python-built widgets (menus, toasts), computed once
+        # here (the window and its density exist by now) instead of on every build/toast.
+        self._dp24 = dp(24)
+        self._sp24 = sp(24)
+        self._sp36 = sp(36)
         # Theme configuration for KivyMD components.
         self.theme_cls.primary_palette = "Blue"
         self.theme_cls.accent_palette = "Green"
@@ -132,6 +206,11 @@ class MyApp(MDApp):
                 "action": "web",
                 "url": "https://daslearning.in/contact/",
             },
+            "Settings": {
+                "icon": "cog",
+                "action": "settings",
+                "url": "",
+            },
             "Check for update": {
                 "icon": "github",
                 "action": "update",
@@ -152,14 +231,38 @@ class MyApp(MDApp):
                 Permission.READ_EXTERNAL_STORAGE,
                 Permission.WRITE_EXTERNAL_STORAGE
             ])
+        # Row templates: the constant part of each chat history row, built once. Widget
+        # defaults (padding, fonts, alignment) live in the KV rules of the row classes and
+        # the RecycleView re-uses row widgets, so a new message only costs a small dict.
+        # User rows start without text selection (see UserMsgItem's long press).
+        self._usr_row_tpl = {"viewclass": "UserMsgItem", "allow_selection": False, "allow_copy": False}
+        self._bot_row_tpl = {"viewclass": "BotMsgItem"}
+        self._stream_row_tpl = {"viewclass": "StreamMsgItem"}
+        # Send button and chat input, captured on the first send. Both are disabled while
+        # an LLM response is pending, so their state is what prevents overlapping requests.
+        self._send_btn = None
+        self._chat_input = None
+        # asyncio.new_event_loop(): a dedicated loop for the LLM calls; run_forever in a
+        # daemon Thread keeps it alive for the whole app session without blocking the UI.
+        self.loop = asyncio.new_event_loop()
+        Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def on_stop(self):
+        # on_stop(): lifecycle hook called when the app closes; stop the LLM loop.
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def build_top_menu(self):
+        # Builds the top menu; called on the first press of the menu button.
+        # MDDropdownMenu: Material Design dropdown menu (e.g., the top-right menu here).
+        from kivymd.uix.menu import MDDropdownMenu
         # Build the top menu entries for MDDropdownMenu. Each dict defines the row.
         menu_items = [
             {
                 "text": menu_key,
                 "leading_icon": self.top_menu_items[menu_key]["icon"],
                 # on_release: MDDropdownMenu calls this when the user taps an item.
-                "on_release": lambda x=menu_key: self.top_menu_callback(x),
-                "font_size": sp(36)
+                "on_release": partial(self.top_menu_callback, menu_key),
+                "font_size": self._sp36
             } for menu_key in self.top_menu_items
         ]
         # MDDropdownMenu(...): create the dropdown; open() will display it later.
@@ -167,12 +270,12 @@ class MyApp(MDApp):
             items=menu_items,
             width_mult=4,
         )
-        # Flag to prevent overlapping requests while awaiting an LLM response.
-        self.is_llm_running = False
 
     def menu_bar_callback(self, button):
         # Called when the app bar/menu button is pressed; opens the dropdown menu.
         # Assigning the menu's caller anchors it to the button for positioning.
+        if self.top_menu is None:
+            self.build_top_menu()
         self.top_menu.caller = button
         self.top_menu.open()
 
@@ -180,8 +283,9 @@ class MyApp(MDApp):
         # Closes the currently open text dialog (MDDialog). `instance` is the button.
         self.txt_dialog.dismiss()
 
-    def top_menu_callback(self, text_item):
-        # Handles a menu selection by key (e.g., "Documentation").
+    def top_menu_callback(self, text_item, *_):
+        # Handles a menu selection by key (e.g., "Documentation"); extra positional args
+        # (the menu item, if Kivy passes it) are ignored.
         self.top_menu.dismiss()
         action = ""
         url = ""
@@ -193,8 +297,10 @@ class MyApp(MDApp):
         # For web actions, open the link; for update, show a dialog with options.
         if action == "web" and url != "":
             self.open_link(url)
+        elif action == "settings":
+            # open_settings(): shows the panel built by build_settings.
+            self.open_settings()
         elif action == "update":
-            # MDFlatButton: low‑emphasis button variant used inside MDDialog.
             buttons = [
                 MDFlatButton(
                     text="Cancel",
@@ -226,7 +332,7 @@ class MyApp(MDApp):
                 font_style = "Subtitle1" # change size for android
             ),
             md_bg_color=bg_color,
-            y=dp(24),
+            y=self._dp24,
             pos_hint={"center_x": 0.5},
             duration=3
         ).open()
@@ -234,6 +340,8 @@ class MyApp(MDApp):
     def show_text_dialog(self, title, text="", buttons=[]):
         # Presents a modal dialog with title/body/buttons. Keep a reference to
         # self.txt_dialog so handlers (e.g., txt_dialog_closer) can dismiss it.
+        # MDDialog: modal dialog container with title/body/buttons.
+        from kivymd.uix.dialog import MDDialog
         self.txt_dialog = MDDialog(
             title=title,
             text=text,
@@ -242,13 +350,20 @@ class MyApp(MDApp):
         self.txt_dialog.open()
 
     # ... (rest of your methods like go_to_chatbot, go_back_to_ollama_input, send_message, update_chatbot_welcome)
+    def _set_ollama_uri(self, uri):
+        # Sets the Ollama base URI and caches its endpoint URLs, so requests do not
+        # rebuild them every time.
+        self.ollama_uri = uri
+        self._tags_url = tags_endpoint(uri)
+        self._chat_url = chat_endpoint(uri)
+
     def go_to_chatbot(self, instance, ollama_uri_widget):
         # Navigates from the Ollama input screen to the main chatbot screen and
         # stores the configured base URI. `instance` is the button; `ollama_uri_widget`
         # is the TextField whose .text contains the user‑entered URI.
         ollama_uri = ollama_uri_widget.text.strip()
         if ollama_uri:
-            self.ollama_uri = ollama_uri
+            self._set_ollama_uri(ollama_uri)
             self.root.current = 'chatbot_screen'
             ollama_uri_widget.text = ""
         else:
@@ -261,159 +376,259 @@ class MyApp(MDApp):
         # Navigate back to the input screen (e.g., to change the Ollama base URI).
         self.root.current = 'ollama_input_screen'
 
-    def add_bot_message(self, instance, msg_to_add):
-        # Renders a bot/assistant message in the chat history.
-        # convert(): Markdown → reStructuredText for richer formatting with your custom widget.
-        rst_txt = convert(msg_to_add)
-        # MyRstDocument: custom RST display widget with configurable base font and padding.
-        bot_msg_label = MyRstDocument(
-            text = rst_txt,
-            base_font_size=36,
-            padding=[dp(10), dp(10)],
-            background_color = self.theme_cls.bg_normal
-        )
-        # MDFloatingActionButton: small floating button; here used as an inline copy icon.
-        copy_btn = MDFloatingActionButton(
-            icon="content-copy",
-            type="small",
-            theme_icon_color="Custom",
-            md_bg_color='#e9dff7',
-            icon_color='#211c29',
-        )
-        # bind(): connects an event (on_release) to a Python callback.
-        copy_btn.bind(on_release=self.copy_rst)
-        bot_msg_label.add_widget(copy_btn)
-        # add_widget(): adds the new message widget to the scrolling chat container.
-        self.chat_history_id.add_widget(bot_msg_label)
-
-    def copy_rst(self, instance):
-        # Copies the (rendered) RST text from the MyRstDocument widget to the clipboard.
-        # instance.parent is the MyRstDocument; its .text holds the RST content.
-        rst_txt = instance.parent.text
+    def set_chat_row(self, row, index=None):
+        # The chat history is a RecycleView: every message is a dict in its `data` list
+        # ({"viewclass": <row class>, ...attributes}) and widgets only exist for rows in
+        # view. Appends `row`, or replaces the row at `index` in place (RecycleView then
+        # refreshes just that row). Rows are never removed and only the pending reply's own
+        # rows are expanded (set_chat_rows), so the reply's index stays valid.
+        data = self.chat_history_id.data
+        if index is None:
+            data.append(row)
+            return len(data) - 1
+        data[index] = row
+        return index
+
+    def set_chat_rows(self, rows, index=None, count=1):
+        # Like set_chat_row for several rows: appends them, or puts them in place of the
+        # `count` rows starting at `index` (rows after them move as needed).
+        data = self.chat_history_id.data
+        if index is None:
+            data.extend(rows)
+        else:
+            data[index:index + count] = rows
+
+    def add_bot_message(self, msg_to_add, index=None, count=1):
+        # Renders a bot/assistant message in the chat history as one BotMsgItem row per
+        # tile (see split_md_tiles), in place of the `count` rows at `index` if given;
+        # only the last tile shows the copy button, which copies the RST of the whole
+        # message. Returns that RST.
+        # _md_to_rst(): cached Markdown → reStructuredText for your custom widget.
+        rst_tiles = [_md_to_rst(tile) for tile in split_md_tiles(msg_to_add)]
+        rst_txt = "\n\n".join(rst_tiles)
+        rows = [self._make_bot_row(rst_tile) for rst_tile in rst_tiles[:-1]]
+        rows.append(self._make_bot_row(rst_tiles[-1], copy_text=rst_txt))
+        self.set_chat_rows(rows, index, count)
+        return rst_txt
+
+    def _make_bot_row(self, rst_txt, copy_text=""):
+        # Factory for a BotMsgItem row: the template plus the RST text (and the text for
+        # its copy button; empty hides the button).
+        return {**self._bot_row_tpl, "rst_text": rst_txt, "copy_text": copy_text}
+
+    def copy_rst(self, rst_txt):
+        # Copies the RST text of a bot message (BotMsgItem.copy_text) to the clipboard.
         Clipboard.copy(rst_txt)
 
     def add_usr_message(self, msg_to_add):
-        # Appends a right‑aligned user message to the chat history using MDLabel with markup.
-        usr_msg_label = MDLabel(
-            size_hint_y=None,
-            markup=True,
-            halign='right',
-            valign='top',
-            padding=[dp(10), dp(10)],
-            font_style="Subtitle1",
-            allow_selection = True,
-            allow_copy = True,
-            text = f"{msg_to_add}",
-        )
-        # bind(texture_size=...): updates widget size when its texture (rendered text) changes.
-        usr_msg_label.bind(texture_size=usr_msg_label.setter('size'))
-        self.chat_history_id.add_widget(usr_msg_label)
+        # Appends a right‑aligned user message (UserMsgItem row, markup enabled).
+        return self.set_chat_row(self._make_usr_row(f"{msg_to_add}"))
+
+    def _make_usr_row(self, text):
+        # Factory for a UserMsgItem row: the template plus the (markup) text.
+        return {**self._usr_row_tpl, "text": text}
 
     def send_message(self, button_instance, chat_input_widget):
-        # Sends the user's message to the LLM if not already awaiting a response.
-        if self.is_llm_running:
-            self.show_toast_msg("Please wait for the current response", is_error=True)
-            return
+        # Sends the user's message to the LLM. While a response is pending the button and
+        # input are disabled, so this cannot be re-entered.
         user_message = chat_input_widget.text.strip()
-        if user_message:
+        if not self.selected_llm:
+            # No model (still loading, or the server has none): a request would go out
+            # with "model": "" and only come back as an Ollama error.
+            if self._models_loading:
+                self.show_toast_msg("Please wait for the models to load!", is_error=True)
+            else:
+                self.show_toast_msg("No model available on this Ollama URI!", is_error=True)
+        elif user_message:
+            if self._send_btn is None:
+                self._send_btn = button_instance
+                self._chat_input = chat_input_widget
+            button_instance.disabled = True
+            chat_input_widget.disabled = True
             # Compose display text and OpenAI‑style content for the message history.
             user_message_add = f"[b][color=#2196F3]You:[/color][/b] {user_message}"
-            self.messages.append(
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            )
+            user_entry = {
+                "role": "user",
+                "content": user_message
+            }
+            self.messages.append(user_entry)
+            self._ctx.append(user_entry)
             self.add_usr_message(user_message_add)
             chat_input_widget.text = "" # blank the input
-            # TempSpinWait: small spinner widget to indicate a pending response.
-            self.tmp_spin = TempSpinWait()
-            self.chat_history_id.add_widget(self.tmp_spin)
-            # Thread(target=..., args=..., daemon=True): run blocking I/O off the UI thread
-            # so the app stays responsive. chat_with_llm will call back into ollama_callback.
-            ollama_thread = Thread(target=chat_with_llm, args=(self.ollama_uri, self.selected_llm, self.messages[-3:], self.ollama_callback), daemon=True)
-            ollama_thread.start()
-            self.is_llm_running = True
+            # TempSpinWait: small spinner row to indicate a pending response. reply_index
+            # remembers its position; the streamed text and then the final bot message
+            # replace it there.
+            self.reply_index = self.set_chat_row({"viewclass": "TempSpinWait"})
+            # stream_text: plain text of the reply's open (last) paragraph streamed so far
+            # (None until the first token); stream_rows: rows of its finished paragraphs.
+            self.stream_text = None
+            self.stream_rows = 0
+            # run_coroutine_threadsafe: submit the chat coroutine to the background loop
+            # so the app stays responsive. Both the per-token callback and the returned
+            # future fire on that loop's thread, so hop back to the UI thread with Clock
+            # before touching widgets (Clock keeps them in order: tokens, then done).
+            msg_body = self._msg_body_template
+            msg_body["model"] = self.selected_llm
+            msg_body["messages"] = list(self._ctx)
+            future = asyncio.run_coroutine_threadsafe(
+                achat_with_llm(
+                    self._chat_url,
+                    msg_body,
+                    partial_callback=lambda token: Clock.schedule_once(lambda dt: self.on_token(token))
+                ),
+                self.loop
+            )
+            future.add_done_callback(
+                lambda f: Clock.schedule_once(lambda dt: self.on_done(f.result()))
+            )
         else:
             self.show_toast_msg("Please type a message!", is_error=True)
 
-    def ollama_callback(self, llm_resp):
-        # Receives streamed/final responses from chat_with_llm and updates UI/state.
+    def on_token(self, token):
+        # Receives one streamed text delta from achat_with_llm. The first one replaces
+        # the spinner row with a plain-text row (no markup, no RST) that then grows; the
+        # RST rendering happens once, in on_done. Like the final tiles, the streamed text
+        # is split at blank lines: each finished paragraph moves to a row of its own, so
+        # only the open paragraph is re-rendered per token (not one texture as tall as
+        # the whole reply). Its row stays at reply_index + stream_rows.
+        if self.stream_text is None:
+            self.stream_text = "Bot: \n"
+        self.stream_text += token
+        tail_index = self.reply_index + self.stream_rows
+        # A new blank line can only be in this token (or start with the char before it).
+        if "\n\n" in self.stream_text[-len(token) - 1:]:
+            finished, _, self.stream_text = self.stream_text.rpartition("\n\n")
+            rows = [
+                {**self._stream_row_tpl, "text": para}
+                for para in finished.split("\n\n") if para.strip()
+            ]
+            rows.append({**self._stream_row_tpl, "text": self.stream_text})
+            self.set_chat_rows(rows, tail_index)
+            self.stream_rows += len(rows) - 1
+        else:
+            self.set_chat_row({**self._stream_row_tpl, "text": self.stream_text}, tail_index)
+
+    def on_done(self, llm_resp):
+        # Receives the final response from achat_with_llm and updates UI/state.
+        # <THINK>...</THINK> meta sections are already stripped while streaming (ollamaApi.ThinkFilter);
+        # an unclosed <think> is kept, as its text arrives with the last delta.
+        api_msg = f"**Bot:** \n{llm_resp['content']}"
+        # Re-enable sending and render the bot message over the spinner/streamed text rows.
+        self.stream_text = None
+        self._send_btn.disabled = False
+        self._chat_input.disabled = False
+        rst_txt = self.add_bot_message(api_msg, self.reply_index, self.stream_rows + 1)
+        self.stream_rows = 0
         if llm_resp["role"] == "assistant":
-            self.messages.append(llm_resp)
-        api_msg = llm_resp["content"]
-        # re.sub: regex replace; here removes any <THINK>...</THINK> meta sections from the model output.
-        api_msg = re.sub(r'<THINK>.*?</THINK>', '', api_msg, flags=re.DOTALL | re.IGNORECASE)
-        api_msg = f"**Bot:** \n{api_msg}"
-        # Remove spinner, mark not running, and render the bot message.
-        self.chat_history_id.remove_widget(self.tmp_spin)
-        self.is_llm_running = False
-        self.add_bot_message(self, api_msg)
+            # Keep the converted RST with the message so it is computed once per reply.
+            self.messages.append({**llm_resp, "rst": rst_txt})
+            self._ctx.append(llm_resp)
 
     def label_copy(self, label_text):
         # Strips Kivy markup tags from a string and copies plain text to clipboard.
-        plain_text = re.sub(r'\[/?(?:color|b|i|u|s|sub|sup|font|font_context|font_family|font_features|size|ref|anchor|text_language).*?\]', '', label_text)
+        plain_text = _MARKUP_RE.sub('', label_text)
         Clipboard.copy(plain_text)
 
-    def llm_menu_callback(self, text_item, screen):
+    def llm_menu_callback(self, text_item, screen, *_):
         # Updates currently selected model and reflects it in the menu button text.
+        # Extra positional args (the menu item, if Kivy passes it) are ignored.
         self.llm_menu.dismiss()
         self.selected_llm = text_item
         screen.ids.llm_menu.text = self.selected_llm
 
     def update_chatbot_welcome(self, screen_instance):
-        # Called when the chat screen is shown; wires IDs, fetches models, builds the LLM menu,
-        # and displays an initial info label with the currently configured Ollama URI.
-        screen_instance.ids.chat_history_id.background_color = self.theme_cls.bg_normal
-        self.chat_history_id = screen_instance.ids.chat_history_id
+        # Called when the chat screen is shown; wires IDs, starts fetching the models for the
+        # LLM menu and displays an initial info label with the currently configured Ollama URI.
+        # (The history background follows the theme by itself, see chatbot_screen.kv.)
+        if self.chat_history_id is None:
+            self.chat_history_id = screen_instance.ids.chat_history_id
         if self.ollama_uri:
-            # get_llm_models(base_url): queries Ollama for available models; returns a list of names.
-            ollama_models = get_llm_models(self.ollama_uri)
-            # Build dropdown menu items for each model.
-            menu_items = [
-                {
-                    "text": f"{model_name}",
-                    "leading_icon": "robot-happy",
-                    "on_release": lambda x=f"{model_name}": self.llm_menu_callback(x, screen_instance),
-                    "font_size": sp(24)
-                } for model_name in ollama_models
-            ]
-            # Create the dropdown menu (items assigned below so we can set defaults first).
+            # Create the dropdown menu right away (empty) so the button works while the
+            # models load; _populate_llm_menu fills in the items.
+            from kivymd.uix.menu import MDDropdownMenu
             self.llm_menu = MDDropdownMenu(
                 md_bg_color="#bdc6b0",
                 caller=screen_instance.ids.llm_menu,
                 items=[],
             )
-            if len(ollama_models) >= 1:
-                self.selected_llm = menu_items[0]["text"]
-                screen_instance.ids.llm_menu.text = self.selected_llm
-                self.llm_menu.items = menu_items
-            else:
-                # No models found: leave menu empty and reflect "None" in the button text.
-                print("No Ollama LLM found!")
-                self.llm_menu.items = []
-                self.selected_llm = "None"
-                screen_instance.ids.llm_menu.text = self.selected_llm
+            # Clear the old selection too: the model list of a (new) URI may not have it.
+            self.selected_llm = ""
+            screen_instance.ids.llm_menu.text = "Loading models…"
+            # This fetch becomes the current one: stop a menu build still running for an
+            # older fetch (its items belong to the old menu / URI).
+            self._models_fetch_id += 1
+            self._models_loading = True
+            if self._llm_menu_ev is not None:
+                self._llm_menu_ev.cancel()
+                self._llm_menu_ev = None
+            # Thread(target=..., daemon=True): the HTTP call runs off the UI thread so the
+            # screen transition does not stall on a slow or unreachable server.
+            Thread(
+                target=self._fetch_models_bg,
+                args=(screen_instance, self._tags_url, self._models_fetch_id),
+                daemon=True
+            ).start()
             # current_timestamp = datetime.now()
             # current_time = current_timestamp.strftime('%H%M%S')
-            # MDLabel here shows a one‑time informational line in the chat history.
-            init_msg_label = MDLabel(
-                size_hint_y=None,
-                markup=True,
-                halign='center',
-                valign='top',
-                padding=[dp(10), dp(10)],
-                font_style="Subtitle1",
-                text = f"[color=#0000FF]Init:[/color] Your Ollama URI: {self.ollama_uri}",
-                # id = f"label-{current_time}"
-            )
-            init_msg_label.bind(texture_size=init_msg_label.setter('size'))
-            screen_instance.ids.chat_history_id.add_widget(init_msg_label)
+            # InfoMsgItem row: a one‑time informational line in the chat history, added on
+            # the next frame so the screen transition gets this frame to itself.
+            init_row = {
+                "viewclass": "InfoMsgItem",
+                "text": f"[color=#0000FF]Init:[/color] Your Ollama URI: {self.ollama_uri}",
+                # "id": f"label-{current_time}"
+            }
+            Clock.schedule_once(lambda dt: self.set_chat_row(init_row))
             # screen_instance.ids.chat_history_id.text = f"Your Ollama URI: {self.ollama_uri}"
         else:
             print("Ollama URI not found")
             # add some popup error
 
+    def _fetch_models_bg(self, screen_instance, tags_url, fetch_id):
+        # Runs in a worker thread: fetch the models, then build the menu on the UI thread.
+        # get_llm_models(tags_url): queries Ollama for available models; returns a list of names.
+        ollama_models = get_llm_models(tags_url)
+        Clock.schedule_once(
+            lambda dt: self._populate_llm_menu(screen_instance, ollama_models, fetch_id)
+        )
+
+    def _populate_llm_menu(self, screen_instance, ollama_models, fetch_id):
+        # Fills the LLM dropdown with the fetched models, spread over several frames:
+        # Clock.schedule_interval(..., 0) resumes the generator once per frame and stops
+        # when the callback returns False (next() returns it once the generator is done).
+        if fetch_id != self._models_fetch_id:
+            # A newer fetch has started since (e.g., the URI was changed): drop this result.
+            return
+        menu_builder = self._llm_menu_builder(screen_instance, ollama_models)
+        self._llm_menu_ev = Clock.schedule_interval(lambda dt: next(menu_builder, False), 0)
+
+    def _llm_menu_builder(self, screen_instance, ollama_models, chunk_size=10):
+        # Generator: builds the menu items `chunk_size` at a time (yielding after each
+        # chunk), then sets them on the menu and selects the first model.
+        menu_items = []
+        for start in range(0, len(ollama_models), chunk_size):
+            # Build dropdown menu items for this chunk of models.
+            menu_items.extend(
+                {
+                    "text": f"{model_name}",
+                    "leading_icon": "robot-happy",
+                    "on_release": partial(self.llm_menu_callback, f"{model_name}", screen_instance),
+                    "font_size": self._sp24
+                } for model_name in ollama_models[start:start + chunk_size]
+            )
+            yield True
+        self._models_loading = False
+        if len(ollama_models) >= 1:
+            self.selected_llm = menu_items[0]["text"]
+            screen_instance.ids.llm_menu.text = self.selected_llm
+            self.llm_menu.items = menu_items
+        else:
+            # No models found: leave menu (and selection) empty and reflect "None" in the
+            # button text.
+            print("No Ollama LLM found!")
+            self.llm_menu.items = []
+            self.selected_llm = ""
+            screen_instance.ids.llm_menu.text = "None"
+
     def update_checker(self, instance):
         # Closes the version dialog and opens the Releases page for manual updates.
         self.txt_dialog.dismiss()
@@ -0,0 +1,28 @@
+# --- Purpose -------------------------------------------------------------------
+# Splits long Markdown bot replies into tiles, each shown as its own chat history row.
+#
+# Kept free of Kivy imports, so it can be used (and tested) without a window.
+
+
+def split_md_tiles(md_text, max_chars=2048):
+    # Splits a Markdown reply at blank lines into tiles of about `max_chars` at most, so a
+    # long reply becomes several small RST rows (smaller textures, cheaper layout, and
+    # the RecycleView only builds the tiles in view). Never splits inside a fenced code
+    # block; a single paragraph longer than `max_chars` becomes a tile of its own.
+    tiles = []
+    current = []
+    size = 0
+    in_fence = False
+    for para in md_text.split("\n\n"):
+        if current and not in_fence and size + len(para) > max_chars:
+            tiles.append("\n\n".join(current))
+            current = []
+            size = 0
+        current.append(para)
+        size += len(para) + 2
+        for line in para.split("\n"):
+            if line.lstrip().startswith(("```", "~~~")):
+                in_fence = not in_fence
+    if current:
+        tiles.append("\n\n".join(current))
+    return tiles
@@ -2,41 +2,174 @@
 # Thin client helpers for talking to an **Ollama** server from Kivy/KivyMD.
 #
 # WHAT this module does
-# - `get_llm_models(url)`: fetch a list of available model names from Ollama.
-# - `chat_with_llm(url, model, messages, callback=None)`: send a chat request to
-#    Ollama and either return the response or schedule a UI‑safe callback.
+# - `tags_endpoint(url)` / `chat_endpoint(url)`: endpoint URLs for an Ollama base URL; callers
+#    compute them once per server instead of on every request.
+# - `get_llm_models(tags_url)`: fetch a list of available model names from Ollama.
+# - `achat_with_llm(chat_url, msg_body, partial_callback=None)`: coroutine that
+#    sends a chat request to Ollama, reports each streamed text delta through
+#    `partial_callback` and returns the full assistant message dict.
 #
 # WHY it exists
 # - Keep network I/O isolated from UI code (screens / widgets).
 # - Provide a single place to adapt payloads (prompting, streaming, parameters).
 #
 # HOW it works
-# - Uses `requests` for HTTP calls (blocking). On success, parses JSON payloads.
-# - If a `callback` is provided to `chat_with_llm`, schedules it on the Kivy main
-#   thread using `Clock.schedule_once`, which is safe for UI updates.
+# - Uses `requests` for the (blocking) model listing and `httpx.AsyncClient` for
+#   chats, so several pending chats can be awaited together (`asyncio.gather`)
+#   instead of each one holding a worker thread for the full round trip.
+# - The app runs `achat_with_llm` on its own asyncio loop (a background thread) and
+#   hops back to the Kivy main thread with `Clock.schedule_once` for UI updates.
+# - Both clients are created once and reused, so HTTP keep-alive saves the TCP (and
+#   TLS) handshake on every request after the first.
 
 import requests  # requests: simple synchronous HTTP client (GET/POST, JSON helpers).
-import json      # json: standard lib for encoding/decoding JSON; here mainly for types/doc.
-from kivy.clock import Clock  # Clock: schedules a function on the Kivy main loop.
+from requests.adapters import HTTPAdapter  # HTTPAdapter: per-host connection pool settings.
+import httpx     # httpx: HTTP client with an asyncio API (AsyncClient) used for chats.
+import json      # json: standard lib for encoding/decoding JSON (fallback codec, see below).
+try:
+    # orjson: C-extension JSON codec, a few times faster than `json` and works on bytes
+    # directly; it matters on the chat stream, which parses one JSON object per token.
+    # Optional: not available everywhere (e.g., no Android recipe), so fall back to json.
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
 
+    def _json_dumps(obj):
+        return json.dumps(obj).encode("utf-8")
 
-def get_llm_models(url):
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# requests.Session(): keeps connections open between calls (HTTP keep-alive).
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# Shared httpx.AsyncClient for chats; created on first use by `_get_async_client` so it
+# belongs to the event loop that runs the chats. Pool limits match `_SESSION`.
+_ASYNC_CLIENT = None
+
+
+def _get_async_client():
+    """
+    Return the module's `httpx.AsyncClient`, creating it on first use.
+
+    - timeout=None: no timeout because generation on slow hardware can take minutes.
+    - httpx.Limits: how many connections are kept alive / opened at most.
+    """
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        _ASYNC_CLIENT = httpx.AsyncClient(
+            timeout=None,
+            limits=httpx.Limits(max_keepalive_connections=4, max_connections=16)
+        )
+    return _ASYNC_CLIENT
+
+
+class ThinkFilter:
     """
-    Return a list of model names available on the Ollama server at `url`.
+    Strip `<think>...</think>` sections (e.g., Deepseek reasoning) from a text stream.
+
+    Feed the chunks in order to `feed()`, which returns the visible part of each, then
+    call `flush()` once at the end. It works in one pass over the stream instead of
+    running a regex over the whole accumulated reply for every chunk.
 
     First usage notes:
-    - f-string: `f"{url}/api/tags"` builds the endpoint URL by inserting `url`.
-    - requests.get(url): executes an HTTP GET request and returns a Response object.
+    - str.lower(): a lowercased probe copy makes the tag search case-insensitive.
+    - str.find(sub, start): index of the next `sub` at or after `start`, or -1.
+
+    State kept between chunks:
+    - _in_think: True while inside an open `<think>` section (text is dropped).
+    - _tag_buf: end of the previous chunk that may be the start of a tag split across
+      chunks (e.g., "<thi"); it is prepended to the next chunk.
+    - _think_parts: the dropped text of the open `<think>` section, starting with the tag.
+      An unclosed `<think>` is not a section after all: `flush()` returns it, so the
+      reply is not lost (same result as the former regex `<think>.*?</think>`).
+    """
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self._in_think = False
+        self._tag_buf = ""
+        self._think_parts = []
+
+    def feed(self, text):
+        text = self._tag_buf + text
+        self._tag_buf = ""
+        probe = text.lower()
+        visible = []
+        pos = 0
+        while True:
+            tag = self.CLOSE_TAG if self._in_think else self.OPEN_TAG
+            idx = probe.find(tag, pos)
+            if idx == -1:
+                # No complete tag left: emit (or drop) the rest, except for a possible
+                # partial tag at the very end, which waits for the next chunk.
+                end = len(text) - self._partial_tag_len(probe, tag, pos)
+                if self._in_think:
+                    self._think_parts.append(text[pos:end])
+                else:
+                    visible.append(text[pos:end])
+                self._tag_buf = text[end:]
+                break
+            if self._in_think:
+                # Section closed: its text really is hidden.
+                self._think_parts = []
+            else:
+                visible.append(text[pos:idx])
+                self._think_parts = [text[idx:idx + len(tag)]]
+            pos = idx + len(tag)
+            self._in_think = not self._in_think
+        return "".join(visible)
+
+    def flush(self):
+        # Whatever was held back is plain text after all, including an unclosed <think>.
+        rest = "".join(self._think_parts) + self._tag_buf
+        self._in_think = False
+        self._tag_buf = ""
+        self._think_parts = []
+        return rest
+
+    @staticmethod
+    def _partial_tag_len(probe, tag, start):
+        # Length of the longest end of probe[start:] that is a proper prefix of `tag`.
+        for n in range(min(len(tag) - 1, len(probe) - start), 0, -1):
+            if probe.endswith(tag[:n]):
+                return n
+        return 0
+
+
+def tags_endpoint(url):
+    """Endpoint listing local models/tags of the Ollama server at base URL `url`."""
+    return f"{url}/api/tags"
+
+
+def chat_endpoint(url):
+    """Native chat endpoint of the Ollama server at base URL `url`."""
+    return f"{url}/api/chat"
+
+
+def get_llm_models(llm_models_url):
+    """
+    Return a list of model names available on an Ollama server.
+
+    Parameters
+    - llm_models_url (str): the server's `/api/tags` endpoint, see `tags_endpoint()`.
+
+    First usage notes:
+    - _SESSION.get(url, timeout=5): executes an HTTP GET request on the shared session
+      (bounded to 5 s so an unreachable server fails fast) and returns a Response object.
     - Response.raise_for_status(): raises for HTTP errors (4xx/5xx) so we can catch them.
     - Response.json(): parses the HTTP response body as JSON into Python objects.
 
     Ollama `/api/tags` returns `{ "models": [ {"name": "..."}, ... ] }`.
     We filter out names containing "embed" to avoid embedding models in the menu.
     """
-    llm_models_url = f"{url}/api/tags"  # endpoint listing local models/tags on Ollama
     got_llm_models = []  # will accumulate plain string names (e.g., "llama3")
     try:
-        response = requests.get(llm_models_url)  # perform the HTTP GET
+        response = _SESSION.get(llm_models_url, timeout=5)  # perform the HTTP GET
         response.raise_for_status()               # raises an HTTPError on 4xx/5xx
         models_data = response.json()            # parse JSON body into a dict
         for model in models_data.get("models", []):  # dict.get: safe access with default []
@@ -50,61 +183,104 @@ def get_llm_models(url):
         return got_llm_models
 
 
-def chat_with_llm(url, model, messages, callback=None):
+async def _aiter_ndjson(response):
     """
-    Send a **chat** request to Ollama and deliver the assistant message.
+    Yield one parsed JSON object per line of a streamed newline-delimited JSON body.
+
+    Lines are split on raw bytes and handed to `_json_loads` as bytes, skipping the
+    str decode that `Response.aiter_lines()` would do first.
+    """
+    pending = b""  # incomplete last line of the previous byte chunk
+    async for data in response.aiter_bytes():
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield _json_loads(line)
+    if pending.strip():
+        yield _json_loads(pending)
+
+
+async def achat_with_llm(chat_url, msg_body, partial_callback=None):
+    """
+    Send a **chat** request to Ollama, streaming the reply, and return the assistant message.
 
     Parameters
-    - url (str): base URL of the Ollama server, e.g., "http://127.0.0.1:11434".
-    - model (str): model name/tag as reported by `/api/tags` or created via `ollama create`.
-    - messages (list): OpenAI‑style message list, e.g., [{"role":"user","content":"hi"}, ...].
-    - callback (callable|None): if provided, schedule it on the main thread with the
-      result dict; otherwise **return** the result dict directly.
+    - chat_url (str): the server's `/api/chat` endpoint, see `chat_endpoint()`.
+    - msg_body (dict): the request payload, serialized as is:
+      {"model": <name/tag from `/api/tags`>, "messages": [{"role":"user","content":"hi"}, ...],
+       "stream": True}. It is serialized when the coroutine starts running, so do not
+      change it until this request has finished.
+    - partial_callback (callable|None): called with each text delta as it arrives, with any
+      `<think>` sections already removed (see ThinkFilter). It runs on the event loop's
+      thread, so UI code must hop to the main thread itself.
 
     First usage notes:
-    - requests.post(url, json=...): sends a JSON body, automatically sets header.
-    - Response.json(): parse JSON response body to a Python dict.
-    - Clock.schedule_once(func): run `func(dt)` in the next frame on the UI thread.
+    - async def: a coroutine; run it on an asyncio loop (`await`, `asyncio.gather`,
+      or `asyncio.run_coroutine_threadsafe` from another thread).
+    - _get_async_client(): the shared non-blocking HTTP client (see above).
+    - AsyncClient.stream(...): like `post`, but the body is read incrementally;
+      `Response.aiter_bytes()` yields it as raw byte chunks (split into lines here).
+    - _json_loads(line) / _json_dumps(obj): orjson (or json) on bytes; Ollama streams
+      newline-delimited JSON, one object per line.
 
     Behavior
-    - Uses `/api/chat` (native Ollama chat) with `stream=False` for simplicity.
-    - Expects a response like `{ "message": {"role": "assistant", "content": "..."}, ... }`.
+    - Uses `/api/chat` (native Ollama chat) with `stream=True`; every line looks like
+      `{ "message": {"role": "assistant", "content": "<delta>"}, "done": false, ... }`
+      and the last one has `"done": true`.
+    - Returns `{"role": "assistant", "content": <all visible deltas joined>}` once done.
     - On error, returns a dict with role "error" and a short markdown message.
+    - Concurrent calls only overlap on the server if it allows it, see
+      `OLLAMA_NUM_PARALLEL` in the README.
     """
-    chat_url = f"{url}/api/chat"  # native Ollama chat endpoint
-    msg_body = {
-        "model": model,
-        "messages": messages,
-        "stream": False
-    }
     return_resp = {
         "role": "init",
         "content": "**Initials** in LLM response!"
     }
+    content_parts = []  # visible deltas collected so far; joined once at the end
+    got_reply = False   # True once the model sent any content (even if only <think>)
+    think_filter = ThinkFilter()
     try:
-        response = requests.post(chat_url, json=msg_body)  # blocking HTTP POST with JSON body
-        respDict = response.json()                         # parse JSON into a dict
-        if "message" in respDict:
-            return_resp = respDict["message"]
+        client = _get_async_client()
+        async with client.stream(
+            "POST", chat_url, content=_json_dumps(msg_body), headers=_JSON_HEADERS
+        ) as response:
+            async for chunk in _aiter_ndjson(response):
+                if "error" in chunk:
+                    # Ollama reports problems (e.g., unknown model) as {"error": "..."}.
+                    raise RuntimeError(chunk["error"])
+                delta = chunk.get("message", {}).get("content", "")
+                if delta:
+                    got_reply = True
+                    delta = think_filter.feed(delta)
+                if delta:
+                    content_parts.append(delta)
+                    if partial_callback:
+                        partial_callback(delta)
+                if chunk.get("done"):
+                    break
+        tail = think_filter.flush()
+        if tail:
+            content_parts.append(tail)
+            if partial_callback:
+                partial_callback(tail)
+        if got_reply:
+            return_resp = {
+                "role": "assistant",
+                "content": "".join(content_parts)
+            }
         else:
             return_resp = {
                 "role": "error",
                 "content": "**Error** in LLM response!"
             }
     except Exception as e:
-        # On any exception (connection refused, timeout, invalid JSON), log and return error shape.
+        # On any exception (connection refused, invalid JSON), log and return error shape.
         print(f"Error with Ollama: {e}")
         return_resp = {
             "role": "error",
             "content": f"**Error** with Ollama: {e}"
         }
-    if callback:
-        # schedule_once: ensures the callback runs on the Kivy main thread, which is required
-        # for UI updates (adding widgets, changing properties, etc.). The lambda wraps the
-        # user callback to pass only the response (and discard dt).
-        Clock.schedule_once(lambda dt: callback(return_resp))
-    else:
-        # If no callback was provided, simply return the response to the caller.
-        return return_resp
+    return return_resp
 
 # End
\ No newline at end of file
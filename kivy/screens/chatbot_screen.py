@@ -3,6 +3,10 @@
 #   • TempSpinWait: a lightweight container used as a temporary spinner/placeholder
 #     while the LLM is generating a response (the actual spinner widget is usually
 #     defined in the KV for this class).
+#   • UserMsgItem / InfoMsgItem / StreamMsgItem / BotMsgItem: the row widgets
+#     ("viewclasses") of the chat history RecycleView. The app never creates them
+#     itself; it appends plain dicts to the RecycleView's `data` and the RecycleView
+#     builds (and re-uses) only as many rows as fit on screen.
 #   • ChatbotScreen: the main Screen that hosts the chat UI (history list, input
 #     field, send button, etc.). The widgets themselves are typically described in
 #     KV files and referenced here via ids.
@@ -17,6 +21,38 @@ from kivymd.uix.screen import MDScreen
 # MDBoxLayout: a Material Design variant of BoxLayout (lays out children in a row
 # or column) with theming and sensible defaults.
 from kivymd.uix.boxlayout import MDBoxLayout
+# MDLabel: text label supporting theming and (optionally) markup.
+from kivymd.uix.label import MDLabel
+# StringProperty: observable string property; KV rules bind to it and update on change.
+from kivy.properties import StringProperty
+# Vector: 2D vector helper; distance() tells a press from a scroll drag.
+from kivy.vector import Vector
+# RecycleDataViewBehavior: lets a RecycleView row know its index in the RecycleView data.
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+# StencilPush/StencilUse/StencilUnUse/StencilPop: the canvas instructions a StencilView
+# (e.g., a ScrollView/RecycleView) uses to clip its children to its own bounds.
+from kivy.graphics import StencilPush, StencilUse, StencilUnUse, StencilPop
+# platform: utility to detect runtime platform ("android", "win", etc.).
+from kivy.utils import platform
+# MyRstDocument: custom widget that renders RST (converted from Markdown) with styling.
+from myrst import MyRstDocument
+
+
+def strip_stencil(widget):
+    # Removes the stencil clipping of a StencilView-based widget. Its canvas.before holds
+    # StencilPush, <mask Rectangle>, StencilUse and canvas.after StencilUnUse, <mask
+    # Rectangle>, StencilPop; each bracket is dropped including its mask rectangle (left
+    # alone it would be drawn as a plain rectangle). Other instructions, such as the
+    # scroll bars, are kept.
+    for canvas in (widget.canvas.before, widget.canvas.after):
+        dropping = False
+        for instruction in list(canvas.children):
+            if isinstance(instruction, (StencilPush, StencilUnUse)):
+                dropping = True
+            if dropping:
+                canvas.remove(instruction)
+            if isinstance(instruction, (StencilUse, StencilPop)):
+                dropping = False
 
 # TempSpinWait is a simple container used while waiting for the model's reply.
 # Typically the visual spinner is declared in the KV file for this class and this
@@ -24,6 +60,63 @@ from kivymd.uix.boxlayout import MDBoxLayout
 class TempSpinWait(MDBoxLayout):
     pass
 
+# Chat history rows. Each class is used as a RecycleView `viewclass`; a data row like
+# {"viewclass": "UserMsgItem", "text": "..."} is shown with a (possibly recycled)
+# UserMsgItem whose attributes are set from the dict. Layout/styling is in KV.
+class UserMsgItem(RecycleDataViewBehavior, MDLabel):
+    # Right-aligned user message with Kivy markup. Text selection/copy (allow_selection,
+    # allow_copy) is off by default because its selection layer is costly per row; a
+    # long press switches it on for this message only, by updating its data row so the
+    # setting follows the message when row widgets are recycled. The long press itself
+    # comes from KivyMD's TouchBehavior (part of MDLabel): `on_long_touch` fires once a
+    # touch is held for `duration_long_touch` seconds.
+
+    def refresh_view_attrs(self, rv, index, data):
+        # Called by the RecycleView when this widget is (re)used for the row at `index`.
+        self.rv = rv
+        self.index = index
+        return super().refresh_view_attrs(rv, index, data)
+
+    def on_touch_down(self, touch):
+        # touch.ud: per-touch dict. Remember the pressed message (index and its data row)
+        # with the touch itself: this widget may show another message by the time the
+        # long touch fires, and every touch keeps its own record.
+        if self.collide_point(*touch.pos) and not self.allow_selection:
+            touch.ud["usr_msg_row"] = (self.index, self.rv.data[self.index])
+        return super().on_touch_down(touch)
+
+    def on_long_touch(self, touch, *args):
+        super().on_long_touch(touch, *args)
+        pressed = touch.ud.get("usr_msg_row")
+        # time_end stays -1 while the touch is down; a touch that moved further than the
+        # RecycleView's scroll_distance is a scroll drag, not a press.
+        if pressed is None or touch.time_end != -1:
+            return
+        if Vector(touch.opos).distance(touch.pos) > self.rv.scroll_distance:
+            return
+        index, row = pressed
+        # Only if that message is still at its index (the history was not changed).
+        if index < len(self.rv.data) and self.rv.data[index] is row:
+            self.rv.data[index] = {**row, "allow_selection": True, "allow_copy": True}
+
+class InfoMsgItem(MDLabel):
+    # Centered informational line (e.g., the configured Ollama URI).
+    pass
+
+class StreamMsgItem(MDLabel):
+    # Plain text of a bot reply that is still streaming in (no markup, no RST).
+    pass
+
+class BotMsgItem(MDBoxLayout):
+    # One tile of a finished bot reply (long replies are split into several rows). The
+    # KV rule builds one MyRstDocument (plus copy button) per BotMsgItem and binds its
+    # text to `rst_text`, so a recycled row re-uses the same document widget and only
+    # re-renders when the text actually changes.
+    rst_text = StringProperty("")
+    # copy_text: RST of the whole reply, set on its last tile only; the copy button is
+    # hidden while it is empty.
+    copy_text = StringProperty("")
+
 # ChatbotScreen is the main chat page. It owns the chat history container and the
 # input area. In this app, most of the UI structure is in KV; this class sets the
 # screen name so the ScreenManager can navigate to it.
@@ -35,3 +128,14 @@ class ChatbotScreen(MDScreen):
         # The `name` attribute is how the ScreenManager refers to this screen. It
         # must match the string used when switching screens (e.g., 'chatbot_screen').
         self.name = 'chatbot_screen'
+
+    def on_kv_post(self, base_widget):
+        # on_kv_post: called once the KV rules of this screen are applied (ids exist).
+        super().on_kv_post(base_widget)
+        if platform == "android":
+            # Stencil clipping costs GPU state changes on every frame, which is slow on
+            # many Android GPUs, so the chat history drops it there. Trade-off: nothing
+            # clips the scrolled rows any more, so they can draw outside the history
+            # area (over the top buttons) while scrolling. The screen manager itself
+            # does not use a stencil and keeps its default SlideTransition.
+            strip_stencil(self.ids.chat_history_id)
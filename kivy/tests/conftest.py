@@ -0,0 +1,6 @@
+# Lets the tests import the app modules (ollamaApi, ...) like main.py does, i.e. from
+# the kivy/ directory. This folder is excluded from the APK (see buildozer.spec).
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
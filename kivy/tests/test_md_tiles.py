@@ -0,0 +1,49 @@
+# Tests for mdTiles.split_md_tiles, which splits long bot replies into chat rows.
+# Run from the kivy/ directory: python -m pytest tests
+from mdTiles import split_md_tiles
+
+
+def test_short_reply_is_one_tile():
+    assert split_md_tiles("Hello\n\nworld") == ["Hello\n\nworld"]
+
+
+def test_empty_input_is_one_empty_tile():
+    # add_bot_message needs at least one tile (the last one carries the copy button).
+    assert split_md_tiles("") == [""]
+
+
+def test_long_reply_is_split_at_blank_lines():
+    md_text = "\n\n".join(["x" * 8] * 6)
+    tiles = split_md_tiles(md_text, max_chars=20)
+    assert len(tiles) > 1
+    assert all(len(tile) <= 20 for tile in tiles)
+
+
+def test_fence_with_blank_lines_stays_in_one_tile():
+    fence = "```python\nfirst = 1\n\n\nsecond = 2\n\nthird = 3\n```"
+    md_text = "Intro\n\n" + fence + "\n\nOutro"
+    tiles = split_md_tiles(md_text, max_chars=10)
+    assert any(fence in tile for tile in tiles)
+    assert [tile.count("```") for tile in tiles if "```" in tile] == [2]
+
+
+def test_tilde_fence_stays_in_one_tile():
+    fence = "~~~\na\n\nb\n~~~"
+    tiles = split_md_tiles("x" * 10 + "\n\n" + fence, max_chars=5)
+    assert tiles[-1] == fence
+
+
+def test_over_long_paragraph_becomes_its_own_tile():
+    long_para = "y" * 50
+    tiles = split_md_tiles("short\n\n" + long_para + "\n\nend", max_chars=20)
+    assert tiles == ["short", long_para, "end"]
+
+
+def test_tiles_join_back_to_the_input():
+    md_text = (
+        "**Bot:** \nSome text\n\n\n\n```\ncode\n\nmore code\n```\n\n"
+        + "\n\n".join("para %d " % n + "z" * n for n in range(40))
+        + "\n\n"
+    )
+    for max_chars in (1, 16, 100, 2048):
+        assert "\n\n".join(split_md_tiles(md_text, max_chars)) == md_text
@@ -0,0 +1,51 @@
+# Tests for ollamaApi.ThinkFilter, the streaming `<think>...</think>` stripper.
+# Run from the kivy/ directory: python -m pytest tests
+import pytest
+
+from ollamaApi import ThinkFilter
+
+
+def run_filter(chunks):
+    # Feed the chunks in order like achat_with_llm does; return the whole visible text.
+    think_filter = ThinkFilter()
+    return "".join(think_filter.feed(chunk) for chunk in chunks) + think_filter.flush()
+
+
+def test_plain_text_passes_through():
+    assert run_filter(["Hello", ", ", "world!"]) == "Hello, world!"
+
+
+def test_think_section_is_removed():
+    assert run_filter(["<think>reasoning</think>Answer"]) == "Answer"
+
+
+def test_tags_are_case_insensitive():
+    assert run_filter(["<THINK>reasoning</Think>Answer"]) == "Answer"
+
+
+@pytest.mark.parametrize("chunks", [
+    ["<th", "ink>reason", "ing</thi", "nk>Answer"],
+    ["<", "t", "h", "i", "n", "k", ">x<", "/", "think", ">", "Answer"],
+])
+def test_tags_split_across_chunks(chunks):
+    assert run_filter(chunks) == "Answer"
+
+
+def test_partial_tag_at_end_is_flushed():
+    # A "<thi" that never becomes a tag is ordinary text.
+    assert run_filter(["a <", "thi"]) == "a <thi"
+
+
+def test_unclosed_think_keeps_rest_of_reply():
+    # No </think>: nothing is hidden, as with the regex <think>.*?</think>.
+    assert run_filter(["Hi <Think>not ", "closed", " </thi"]) == "Hi <Think>not closed </thi"
+
+
+def test_unclosed_think_is_only_returned_by_flush():
+    think_filter = ThinkFilter()
+    assert think_filter.feed("Hi <think>still thinking") == "Hi "
+    assert think_filter.flush() == "<think>still thinking"
+
+
+def test_stray_close_tag_is_visible():
+    assert run_filter(["a</think>b"]) == "a</think>b"